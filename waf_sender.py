@@ -29,6 +29,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 站点流量监控项的key名称（与模板中的 waf.site.<key>[站点名] 对应）
+SITE_METRIC_KEYS = (
+    'bytes_in_rate_avg',
+    'bytes_in_rate_max',
+    'bytes_out_rate_avg',
+    'bytes_out_rate_max',
+    'conn_cur_avg',
+    'conn_cur_max',
+    'conn_rate_avg',
+    'http_req_cnt_avg',
+    'http_req_cnt_max',
+    'http_req_rate_avg',
+)
+
 class WAFCollector:
     """WAF数据采集器"""
     
@@ -569,13 +583,14 @@ class WAFCollector:
             'clock': timestamp
         })
         
-        # 收集每个站点的流量数据
+        # 收集每个站点的流量数据（循环内使用局部变量，避免重复的属性查找）
+        host = self.zabbix_host
         for site in sites:
             site_name = site['name']
             
             # 站点状态
             all_data.append({
-                'host': self.zabbix_host,
+                'host': host,
                 'key': f'waf.site.status[{site_name}]',
                 'value': 1 if site['enabled'] else 0,
                 'clock': timestamp
@@ -596,13 +611,13 @@ class WAFCollector:
                     bytes_in_max = traffic_data.get('bytesInRateMax', 0)
                     all_data.extend([
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.bytes_in_rate_avg[{site_name}]',
                             'value': bytes_in_avg,  # 已经是bps，无需转换
                             'clock': data_timestamp
                         },
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.bytes_in_rate_max[{site_name}]',
                             'value': bytes_in_max,
                             'clock': data_timestamp
@@ -614,13 +629,13 @@ class WAFCollector:
                     bytes_out_max = traffic_data.get('bytesOutRateMax', 0)
                     all_data.extend([
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.bytes_out_rate_avg[{site_name}]',
                             'value': bytes_out_avg,
                             'clock': data_timestamp
                         },
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.bytes_out_rate_max[{site_name}]',
                             'value': bytes_out_max,
                             'clock': data_timestamp
@@ -633,19 +648,19 @@ class WAFCollector:
                     conn_rate_avg = traffic_data.get('connRateAvg', 0)
                     all_data.extend([
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.conn_cur_avg[{site_name}]',
                             'value': conn_cur_avg,
                             'clock': data_timestamp
                         },
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.conn_cur_max[{site_name}]',
                             'value': conn_cur_max,
                             'clock': data_timestamp
                         },
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.conn_rate_avg[{site_name}]',
                             'value': conn_rate_avg,
                             'clock': data_timestamp
@@ -658,19 +673,19 @@ class WAFCollector:
                     http_req_rate_avg = traffic_data.get('httpReqRateAvg', 0)
                     all_data.extend([
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.http_req_cnt_avg[{site_name}]',
                             'value': http_req_cnt_avg,
                             'clock': data_timestamp
                         },
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.http_req_cnt_max[{site_name}]',
                             'value': http_req_cnt_max,
                             'clock': data_timestamp
                         },
                         {
-                            'host': self.zabbix_host,
+                            'host': host,
                             'key': f'waf.site.http_req_rate_avg[{site_name}]',
                             'value': http_req_rate_avg,
                             'clock': data_timestamp
@@ -680,18 +695,10 @@ class WAFCollector:
                 logger.info(f"站点 {site_name} 收集了 {len(traffic_data_points)} 个数据点")
             else:
                 # 站点禁用时，发送0值
-                all_data.extend([
-                    {'host': self.zabbix_host, 'key': f'waf.site.bytes_in_rate_avg[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.bytes_in_rate_max[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.bytes_out_rate_avg[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.bytes_out_rate_max[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.conn_cur_avg[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.conn_cur_max[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.conn_rate_avg[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.http_req_cnt_avg[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.http_req_cnt_max[{site_name}]', 'value': 0, 'clock': timestamp},
-                    {'host': self.zabbix_host, 'key': f'waf.site.http_req_rate_avg[{site_name}]', 'value': 0, 'clock': timestamp}
-                ])
+                all_data.extend(
+                    {'host': host, 'key': f'waf.site.{k}[{site_name}]', 'value': 0, 'clock': timestamp}
+                    for k in SITE_METRIC_KEYS
+                )
                     
         return all_data
         
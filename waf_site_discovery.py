@@ -9,19 +9,164 @@ import sys
 import json
 import time
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 import urllib3
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 请求超时（连接超时, 读取超时），单位秒
+REQUEST_TIMEOUT = (2, 8)    # 设备、站点列表等普通接口
+PROBE_TIMEOUT = (1.5, 3)    # 流量接口探测
+
+# 需要捕获的接口错误：请求失败，以及JSON解析失败或返回结构不符合预期（统一为ValueError）
+_API_ERRORS = (requests.RequestException, ValueError)
+
+
+def _loads(content):
+    """
+    解析响应体中的JSON，安装了orjson时优先使用orjson
+    
+    :param content: 响应体字节串
+    :return: 解析后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _load_object(content):
+    """
+    解析接口响应，顶层必须是JSON对象
+    
+    :param content: 响应体字节串
+    :return: 解析后的dict
+    :raises ValueError: 不是合法的JSON或顶层不是对象
+    """
+    data = _loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("接口返回的不是JSON对象")
+    return data
+
+
+def _field(obj, key, kind):
+    """
+    取出接口返回中的字段并检查类型，字段缺失或为null时返回空值
+    
+    :param obj: 接口返回的dict
+    :param key: 字段名
+    :param kind: 期望的类型（dict或list）
+    :return: 字段值
+    :raises ValueError: 字段类型不符合预期
+    """
+    value = obj.get(key)
+    if value is None:
+        return kind()
+    if not isinstance(value, kind):
+        raise ValueError(f"接口返回的{key}字段类型错误")
+    return value
+
+
+def _as_int(value):
+    """
+    将接口返回的数量字段转换为整数
+    
+    :param value: 数量字段（整数或数字字符串）
+    :return: 整数
+    :raises ValueError: 无法转换
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"接口返回的数量字段类型错误: {value!r}")
+    return int(value)
+
+
+def _site_list(page_data):
+    """
+    取出一页站点数据中的站点列表，并检查每个站点都是对象
+    
+    :param page_data: 站点接口返回的data字段
+    :return: 站点列表
+    :raises ValueError: 站点条目不是对象
+    """
+    sites = _field(page_data, "result", list)
+    if not all(isinstance(site, dict) for site in sites):
+        raise ValueError("接口返回的站点条目不是对象")
+    return sites
+
+
+def _dumps(obj):
+    """
+    序列化为JSON字符串，安装了orjson时优先使用orjson
+
+    :param obj: 待序列化的对象
+    :return: JSON字符串（UTF-8，不转义中文）
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _has_data(result):
+    """
+    判断流量数据中是否有有效值（除timestamp外不全是"-"）
+    
+    :param result: 流量接口返回的记录列表
+    :return: True表示有有效数据
+    """
+    for record in result:
+        if not isinstance(record, dict):
+            raise ValueError("接口返回的流量记录不是对象")
+        for key, value in record.items():
+            if key != "timestamp" and value != "-":
+                return True
+    return False
+
+
+def _emit(obj, out=None):
+    """
+    输出JSON结果
+    
+    :param obj: 待输出的对象
+    :param out: 输出流（可选），指定时直接写入并返回None
+    :return: 未指定out时返回JSON字符串
+    """
+    if out is None:
+        return _dumps(obj)
+    out.write(_dumps(obj))
+    out.write("\n")
+    return None
+
+
+def _write_lld(items, out):
+    """
+    逐条写出Zabbix LLD数据，避免拼接完整的JSON字符串
+    
+    :param items: LLD条目的可迭代对象
+    :param out: 文本输出流
+    """
+    out.write('{"data":[')
+    sep = ''
+    for item in items:
+        out.write(sep)
+        out.write(_dumps(item))
+        sep = ','
+    out.write(']}\n')
 
-# 禁用SSL警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class WAFSiteDiscovery:
-    def __init__(self, host, token):
+    def __init__(self, host, token, verify=False):
         """
         初始化WAF客户端
         
         :param host: WAF管理地址
         :param token: API Token
+        :param verify: 证书校验，False表示不校验，也可传入CA证书文件路径
         """
         self.host = host.rstrip('/')
         self.token = token
@@ -29,58 +174,122 @@ class WAFSiteDiscovery:
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
+        # 复用同一个会话，避免每次请求都重新建立TCP+TLS连接
+        self.session = requests.Session()
+        self.session.verify = verify
+        if verify is False:
+            # 不校验证书时禁用SSL警告
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=16,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504))
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # /api/v1/device/name/ 返回的设备ID对所有站点相同，缓存后复用
+        self._cached_device_id = None
+        self._device_id_cache_ts = 0
+        self._device_id_lock = threading.Lock()
+        # 流量接口探测结果缓存，同一个候选device_id在一次发现过程中只探测一次
+        self._traffic_probe_cache = {}
+        self._probe_locks = {}
+        self._probe_lock = threading.Lock()
+        # 站点列表缓存，get_device_mapping和discover_sites共用
+        self._sites = None
+        # find_device_id_for_site的结果缓存，key为app_id
+        self._find_cache = {}
     
-    def get_device_mapping(self):
+    def _probe_device(self, device_id, app_id, require_data=False):
         """
-        获取设备ID映射关系
-        使用 /api/v1/device/name/ 接口获取设备ID
+        通过流量接口探测device_id是否可用，结果按候选device_id缓存
         
-        :return: dict，key为app_id，value为实际的device_id
+        :param device_id: 候选的device_id
+        :param app_id: 用于探测的站点ID
+        :param require_data: 是否要求返回有效流量数据（不全是"-"），此时按(device_id, app_id)缓存
+        :return: True表示可用，False表示不可用；请求异常时直接抛出，不缓存
         """
-        mapping = {}
+        key = (device_id, app_id) if require_data else device_id
+        with self._probe_lock:
+            key_lock = self._probe_locks.setdefault(key, threading.Lock())
         
-        try:
-            # 从 /api/v1/device/name/ 接口获取设备ID
-            device_name_url = f"{self.host}/api/v1/device/name/"
-            params = {"_ts": int(time.time() * 1000)}
+        with key_lock:
+            if key in self._traffic_probe_cache:
+                return self._traffic_probe_cache[key]
             
-            response = requests.get(
-                device_name_url,
-                headers=self.headers,
+            params = {
+                "type": "mins",
+                "app_id": app_id,
+                "device_id": device_id
+            }
+            response = self.session.get(
+                f"{self.host}/api/v1/logs/traffic/",
                 params=params,
-                verify=False,
-                timeout=10
+                timeout=PROBE_TIMEOUT
+            )
+            
+            ok = False
+            if response.status_code == 200:
+                data = _load_object(response.content)
+                if data.get("code") == "SUCCESS":
+                    if require_data:
+                        result = _field(_field(data, "data", dict), "result", list)
+                        ok = _has_data(result)
+                    else:
+                        ok = True
+            
+            self._traffic_probe_cache[key] = ok
+            return ok
+    
+    def _get_device_name_id(self):
+        """
+        从 /api/v1/device/name/ 接口获取设备ID，60秒内复用缓存结果
+        
+        :return: device_id (UUID格式) 或 None
+        """
+        with self._device_id_lock:
+            if self._cached_device_id is not None and time.time() - self._device_id_cache_ts < 60:
+                return self._cached_device_id
+            
+            response = self.session.get(
+                f"{self.host}/api/v1/device/name/",
+                timeout=REQUEST_TIMEOUT
             )
             
             device_id = None
             if response.status_code == 200:
-                data = response.json()
+                data = _load_object(response.content)
                 if data.get("code") == "SUCCESS":
-                    device_id = data.get("data", {}).get("id")
+                    device_id = _field(data, "data", dict).get("id")
+            
+            if device_id:
+                self._cached_device_id = device_id
+                self._device_id_cache_ts = time.time()
+            return device_id
+    
+    def get_device_mapping(self):
+        """
+        获取设备ID映射关系
+        使用 /api/v1/device/name/ 接口获取设备ID
+        
+        :return: dict，key为app_id，value为实际的device_id
+        """
+        mapping = {}
+        
+        try:
+            # 从 /api/v1/device/name/ 接口获取设备ID
+            device_id = self._get_device_name_id()
             
             # 如果成功获取到device_id，为所有站点使用这个ID
             if device_id:
                 # 获取所有站点
-                site_url = f"{self.host}/api/v1/website/site/"
-                site_params = {"page": 1, "per_page": 1000}
-                site_response = requests.get(
-                    site_url,
-                    headers=self.headers,
-                    params=site_params,
-                    verify=False,
-                    timeout=10
-                )
-                
-                if site_response.status_code == 200:
-                    site_data = site_response.json()
-                    if site_data.get("code") == "SUCCESS":
-                        sites = site_data.get("data", {}).get("result", [])
-                        for site in sites:
-                            site_id = site.get("_pk")
-                            if site_id:
-                                mapping[site_id] = device_id
+                for site in self._get_sites():
+                    site_id = site.get("_pk")
+                    if site_id:
+                        mapping[site_id] = device_id
                 
-        except Exception:
+        except _API_ERRORS:
             pass
         
         return mapping
@@ -88,7 +297,21 @@ class WAFSiteDiscovery:
     def find_device_id_for_site(self, app_id, debug=False):
         """
         为特定站点查找正确的device_id
-        使用 /api/v1/device/name/ 接口获取设备ID
+        使用 /api/v1/device/name/ 接口获取设备ID，结果按站点缓存在实例上
+        
+        :param app_id: 站点ID
+        :param debug: 是否启用调试输出
+        :return: device_id (UUID格式) 或 None
+        """
+        if app_id in self._find_cache:
+            return self._find_cache[app_id]
+        device_id = self._find_device_id_for_site(app_id, debug)
+        self._find_cache[app_id] = device_id
+        return device_id
+    
+    def _find_device_id_for_site(self, app_id, debug=False):
+        """
+        find_device_id_for_site的实际查找逻辑（不走缓存）
         
         :param app_id: 站点ID
         :param debug: 是否启用调试输出
@@ -96,55 +319,25 @@ class WAFSiteDiscovery:
         """
         try:
             # 从 /api/v1/device/name/ 接口获取设备ID
-            device_name_url = f"{self.host}/api/v1/device/name/"
-            params = {"_ts": int(time.time() * 1000)}
-            
-            response = requests.get(
-                device_name_url,
-                headers=self.headers,
-                params=params,
-                verify=False,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == "SUCCESS":
-                    device_id = data.get("data", {}).get("id")
-                    if device_id:
-                        if debug:
-                            print(f"[DEBUG] 从/api/v1/device/name/接口获取到device_id: {device_id}")
-                        # 可选：验证这个device_id是否能获取到流量数据
-                        if app_id:  # 只有提供了app_id才验证
-                            traffic_url = f"{self.host}/api/v1/logs/traffic/"
-                            test_params = {
-                                "type": "mins",
-                                "app_id": app_id,
-                                "device_id": device_id,
-                                "_ts": int(time.time() * 1000)
-                            }
-                            try:
-                                test_response = requests.get(
-                                    traffic_url,
-                                    headers=self.headers,
-                                    params=test_params,
-                                    verify=False,
-                                    timeout=5
-                                )
-                                if test_response.status_code == 200:
-                                    test_data = test_response.json()
-                                    if test_data.get("code") == "SUCCESS":
-                                        if debug:
-                                            print(f"[DEBUG] device_id验证成功，可以获取流量数据")
-                                        return device_id
-                            except:
-                                # 即使验证失败，也返回获取到的device_id
-                                if debug:
-                                    print(f"[DEBUG] device_id验证失败，但仍使用该ID")
-                                return device_id
-                        else:
+            device_id = self._get_device_name_id()
+            if device_id:
+                if debug:
+                    print(f"[DEBUG] 从/api/v1/device/name/接口获取到device_id: {device_id}")
+                # 可选：验证这个device_id是否能获取到流量数据
+                if app_id:  # 只有提供了app_id才验证
+                    try:
+                        if self._probe_device(device_id, app_id):
+                            if debug:
+                                print(f"[DEBUG] device_id验证成功，可以获取流量数据")
                             return device_id
-        except Exception as e:
+                    except _API_ERRORS:
+                        # 即使验证失败，也返回获取到的device_id
+                        if debug:
+                            print(f"[DEBUG] device_id验证失败，但仍使用该ID")
+                        return device_id
+                else:
+                    return device_id
+        except _API_ERRORS as e:
             if debug:
                 print(f"[DEBUG] 获取device_id失败: {e}")
         
@@ -153,165 +346,205 @@ class WAFSiteDiscovery:
             print(f"[DEBUG] 无法获取device_id，返回None")
         return None
     
-    def discover_sites(self, debug=False):
+    def _fetch_site_page(self, page, per_page=1000):
+        """
+        获取一页站点列表
+        
+        :param page: 页码
+        :param per_page: 每页数量
+        :return: 该页的响应数据（data字段）
+        """
+        response = self.session.get(
+            f"{self.host}/api/v1/website/site/",
+            params={"page": page, "per_page": per_page},
+            timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise requests.HTTPError(f"HTTP错误: {response.status_code}", response=response)
+        data = _load_object(response.content)
+        if data.get("code") != "SUCCESS":
+            raise ValueError(f"API返回错误: {data.get('message', '未知错误')}")
+        return _field(data, "data", dict)
+    
+    def _get_sites(self, per_page=1000):
+        """
+        获取全部站点列表，结果缓存在实例上，同一次运行中只请求一次
+        
+        :param per_page: 每页数量
+        :return: 站点列表
+        """
+        if self._sites is not None:
+            return self._sites
+        
+        page_data = self._fetch_site_page(1, per_page)
+        sites = _site_list(page_data)
+        
+        # 站点数量超过一页时，根据返回的总数并发获取剩余分页
+        page_count = page_data.get("page_count")
+        if not page_count:
+            total = page_data.get("total", page_data.get("count"))
+            page_count = -(-_as_int(total) // per_page) if total else 1
+        page_count = _as_int(page_count)
+        if page_count > 1:
+            with ThreadPoolExecutor(max_workers=min(8, page_count - 1)) as executor:
+                for more in executor.map(
+                    lambda page: self._fetch_site_page(page, per_page), range(2, page_count + 1)
+                ):
+                    sites.extend(_site_list(more))
+        
+        self._sites = sites
+        return sites
+    
+    def discover_sites(self, debug=False, out=None):
         """
         发现所有站点
         
         :param debug: 是否启用调试输出
-        :return: Zabbix LLD格式的JSON数据
+        :param out: 输出流（可选），指定时逐条写出LLD数据，不再拼接完整字符串
+        :return: Zabbix LLD格式的JSON数据；指定out时返回None
         """
         try:
             # 构建站点ID到实际device_id的映射
             site_device_mapping = {}
             
             # 获取站点列表
-            url = f"{self.host}/api/v1/website/site/"
-            params = {
-                "page": 1,
-                "per_page": 1000  # 获取尽可能多的站点
-            }
+            sites = self._get_sites()
             
-            response = requests.get(
-                url,
-                headers=self.headers,
-                params=params,
-                verify=False,
-                timeout=10
-            )
+            # 先为每个站点查找正确的device_id
+            if debug:
+                print(f"[DEBUG] 发现 {len(sites)} 个站点")
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == "SUCCESS":
-                    sites = data.get("data", {}).get("result", [])
-                    
-                    # 先为每个站点查找正确的device_id
-                    if debug:
-                        print(f"[DEBUG] 发现 {len(sites)} 个站点")
-                    
-                    for site in sites:
-                        site_id = site.get("_pk", "")
-                        site_name = site.get("name", "")
-                        struct_pk = site.get("struct_pk", "")
-                        
-                        if debug:
-                            print(f"[DEBUG] 处理站点: {site_name} (ID: {site_id}, struct_pk: {struct_pk})")
-                        
-                        # 如果struct_pk是"0"（全局配置），需要查找实际的device_id
-                        if struct_pk == "0":
-                            actual_device_id = self.find_device_id_for_site(site_id, debug)
-                            if actual_device_id:
-                                site_device_mapping[site_id] = actual_device_id
-                                if debug:
-                                    print(f"[DEBUG] 站点 {site_name} 使用device_id: {actual_device_id}")
-                            else:
-                                # 如果找不到，尝试通过实际请求流量API来探测
-                                test_url = f"{self.host}/api/v1/logs/traffic/"
-                                
-                                # 尝试一些常见的device_id格式
-                                for test_id in [site_id, struct_pk]:
-                                    if test_id and test_id != "0":
-                                        test_params = {
-                                            "type": "mins",
-                                            "app_id": site_id,
-                                            "device_id": test_id,
-                                            "_ts": int(time.time() * 1000)
-                                        }
-                                        try:
-                                            test_response = requests.get(
-                                                test_url,
-                                                headers=self.headers,
-                                                params=test_params,
-                                                verify=False,
-                                                timeout=5
-                                            )
-                                            if test_response.status_code == 200:
-                                                test_data = test_response.json()
-                                                if test_data.get("code") == "SUCCESS":
-                                                    result = test_data.get("data", {}).get("result", [])
-                                                    if result and any(v != "-" for record in result for k, v in record.items() if k != "timestamp"):
-                                                        site_device_mapping[site_id] = test_id
-                                                        break
-                                        except:
-                                            pass
-                        else:
-                            # struct_pk不是"0"，直接使用
-                            site_device_mapping[site_id] = struct_pk
-                            if debug:
-                                print(f"[DEBUG] 站点 {site_name} 使用struct_pk作为device_id: {struct_pk}")
-                    
-                    # 构建Zabbix LLD格式的数据
-                    discovery_data = {
-                        "data": []
-                    }
-                    
-                    for site in sites:
-                        site_id = site.get("_pk", "")
-                        site_type = site.get("type", "")
-                        struct_pk = site.get("struct_pk", "")
-                        
-                        # 使用之前找到的device_id
-                        effective_device_id = site_device_mapping.get(site_id, struct_pk)
-                        
-                        # 如果device_id无效（None或"0"），跳过或警告
-                        if not effective_device_id or effective_device_id == "0":
-                            if debug:
-                                print(f"[DEBUG] 警告：站点 {site.get('name')} 没有有效的device_id，使用struct_pk: {struct_pk}")
-                            # 如果struct_pk也是"0"，可能需要特殊处理
-                            if struct_pk == "0":
-                                if debug:
-                                    print(f"[DEBUG] 错误：站点 {site.get('name')} 无法获取有效的device_id，跳过")
-                                continue  # 跳过这个站点
-                        
-                        # 获取站点基本信息
-                        site_info = {
-                            "{#SITE_ID}": site_id,
-                            "{#SITE_NAME}": site.get("name", ""),
-                            "{#SITE_TYPE}": site_type,
-                            "{#SITE_IP}": site.get("ip_set", ""),
-                            "{#SITE_PORT}": ",".join(map(str, site.get("port", []))),
-                            "{#SITE_DOMAIN}": ",".join(site.get("domain", [])),
-                            "{#SITE_ENABLE}": "1" if site.get("enable", False) else "0",
-                            "{#STRUCT_ID}": effective_device_id,  # 使用找到的device_id
-                            "{#DEVICE_ID}": effective_device_id,  # 备用
-                            "{#STRUCT_PK}": struct_pk  # 原始的struct_pk值，用于调试
-                        }
-                        
-                        discovery_data["data"].append(site_info)
-                    
-                    return json.dumps(discovery_data, ensure_ascii=False)
-                else:
-                    raise Exception(f"API返回错误: {data.get('message', '未知错误')}")
-            else:
-                raise Exception(f"HTTP错误: {response.status_code}")
+            # 各站点的探测都是网络I/O，使用线程池并发执行
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                for site_id, device_id in executor.map(
+                    lambda site: self._resolve_site_device_id(site, debug), sites
+                ):
+                    if device_id is not None:
+                        site_device_mapping[site_id] = device_id
+            
+            # 构建Zabbix LLD格式的数据
+            # 先生成全部条目再开始写出，出错时不会留下写了一半的JSON
+            items = list(self._iter_site_lld(sites, site_device_mapping, debug))
+            if out is not None:
+                _write_lld(items, out)
+                return None
+            return _dumps({"data": list(items)})
                 
-        except Exception as e:
+        except _API_ERRORS as e:
             # Zabbix期望在错误时返回空的发现数据
             error_data = {
                 "data": [],
                 "error": str(e)
             }
-            return json.dumps(error_data, ensure_ascii=False)
+            return _emit(error_data, out)
+    
+    def _resolve_site_device_id(self, site, debug=False):
+        """
+        确定单个站点实际使用的device_id
+        
+        :param site: 站点信息
+        :param debug: 是否启用调试输出
+        :return: (site_id, device_id)，找不到时device_id为None
+        """
+        site_id = site.get("_pk", "")
+        site_name = site.get("name", "")
+        struct_pk = site.get("struct_pk", "")
+        
+        if debug:
+            print(f"[DEBUG] 处理站点: {site_name} (ID: {site_id}, struct_pk: {struct_pk})")
+        
+        # struct_pk不是"0"，直接使用
+        if struct_pk != "0":
+            if debug:
+                print(f"[DEBUG] 站点 {site_name} 使用struct_pk作为device_id: {struct_pk}")
+            return site_id, struct_pk
+        
+        # 如果struct_pk是"0"（全局配置），需要查找实际的device_id
+        actual_device_id = self.find_device_id_for_site(site_id, debug)
+        if actual_device_id:
+            if debug:
+                print(f"[DEBUG] 站点 {site_name} 使用device_id: {actual_device_id}")
+            return site_id, actual_device_id
+        
+        # 如果找不到，尝试直接用站点ID作为device_id请求流量API来探测
+        # （此分支中struct_pk必为"0"，无需再尝试）
+        if site_id:
+            try:
+                if self._probe_device(site_id, site_id, require_data=True):
+                    return site_id, site_id
+            except _API_ERRORS:
+                pass
+        
+        return site_id, None
+    
+    def _iter_site_lld(self, sites, site_device_mapping, debug=False):
+        """
+        逐个生成站点的LLD条目
+        
+        :param sites: 站点列表
+        :param site_device_mapping: 站点ID到device_id的映射
+        :param debug: 是否启用调试输出（输出到stderr，避免打断流式写出的JSON）
+        :return: LLD条目的生成器
+        """
+        for site in sites:
+            g = site.get
+            site_id = g("_pk", "")
+            struct_pk = g("struct_pk", "")
+            
+            # 使用之前找到的device_id
+            effective_device_id = site_device_mapping.get(site_id, struct_pk)
+            
+            # 如果device_id无效（None或"0"），跳过或警告
+            if not effective_device_id or effective_device_id == "0":
+                if debug:
+                    print(f"[DEBUG] 警告：站点 {g('name')} 没有有效的device_id，使用struct_pk: {struct_pk}", file=sys.stderr)
+                # 如果struct_pk也是"0"，可能需要特殊处理
+                if struct_pk == "0":
+                    if debug:
+                        print(f"[DEBUG] 错误：站点 {g('name')} 无法获取有效的device_id，跳过", file=sys.stderr)
+                    continue  # 跳过这个站点
+            
+            # 只对非字符串的端口调用str()，字段缺失或为null时按空处理，单个值按一项处理，忽略null元素
+            ports = g("port") or ()
+            if not isinstance(ports, (list, tuple)):
+                ports = (ports,)
+            domains = g("domain") or ()
+            if not isinstance(domains, (list, tuple)):
+                domains = (domains,)
+            
+            # 获取站点基本信息
+            yield {
+                "{#SITE_ID}": site_id,
+                "{#SITE_NAME}": g("name", ""),
+                "{#SITE_TYPE}": g("type", ""),
+                "{#SITE_IP}": g("ip_set", ""),
+                "{#SITE_PORT}": ",".join([p if type(p) is str else str(p) for p in ports if p is not None]),
+                "{#SITE_DOMAIN}": ",".join([d if type(d) is str else str(d) for d in domains if d is not None]),
+                "{#SITE_ENABLE}": "1" if g("enable") else "0",
+                "{#STRUCT_ID}": effective_device_id,  # 使用找到的device_id
+                "{#DEVICE_ID}": effective_device_id,  # 备用
+                "{#STRUCT_PK}": struct_pk  # 原始的struct_pk值，用于调试
+            }
     
-    def discover_devices(self):
+    def discover_devices(self, out=None):
         """
         发现设备信息（如果是集群环境）
         
-        :return: Zabbix LLD格式的JSON数据
+        :param out: 输出流（可选），指定时直接写出结果
+        :return: Zabbix LLD格式的JSON数据；指定out时返回None
         """
         try:
             # 首先获取设备基本信息
             device_info_url = f"{self.host}/api/v1/device/info/"
-            response = requests.get(
+            response = self.session.get(
                 device_info_url,
-                headers=self.headers,
-                verify=False,
-                timeout=10
+                timeout=REQUEST_TIMEOUT
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _load_object(response.content)
                 if data.get("code") == "SUCCESS":
-                    device_data = data.get("data", {})
+                    device_data = _field(data, "data", dict)
                     
                     # 构建设备发现数据
                     discovery_data = {
@@ -322,13 +555,13 @@ class WAFSiteDiscovery:
                         }]
                     }
                     
-                    return json.dumps(discovery_data, ensure_ascii=False)
+                    return _emit(discovery_data, out)
             
             # 如果无法获取设备信息，返回空数据
-            return json.dumps({"data": []})
+            return _emit({"data": []}, out)
             
-        except Exception as e:
-            return json.dumps({"data": [], "error": str(e)})
+        except _API_ERRORS as e:
+            return _emit({"data": [], "error": str(e)}, out)
 
 
 def main():
@@ -341,17 +574,18 @@ def main():
     parser.add_argument('--type', choices=['sites', 'devices'], default='sites', 
                        help='发现类型：sites(站点) 或 devices(设备)')
     parser.add_argument('--debug', action='store_true', help='启用调试输出')
+    parser.add_argument('--ca-bundle', help='用于校验WAF证书的CA证书文件（不指定则不校验证书）')
     
     args = parser.parse_args()
     
     # 创建发现客户端
-    discovery = WAFSiteDiscovery(host=args.host, token=args.token)
+    discovery = WAFSiteDiscovery(host=args.host, token=args.token, verify=args.ca_bundle or False)
     
     # 执行发现
     if args.type == 'sites':
-        print(discovery.discover_sites(debug=args.debug))
+        discovery.discover_sites(debug=args.debug, out=sys.stdout)
     else:
-        print(discovery.discover_devices())
+        discovery.discover_devices(out=sys.stdout)
 
 
 if __name__ == "__main__":
@@ -5,52 +5,338 @@
 用于Zabbix监控项数据采集
 """
 
+import os
 import sys
 import json
 import time
+import errno
+import fcntl
+import stat
+import hashlib
 import argparse
-import requests
-from datetime import datetime
-import urllib3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 请求超时（连接超时, 读取超时），单位秒；流量接口需要聚合分钟数据，读取超时放宽
+DEFAULT_TIMEOUT = (3, 7)
+SLOW_TIMEOUT = (3, 15)
+
+# 集群拓扑树的站点类型
+_SITE_TYPES = ('transparent', 'reverse', 'traction', 'sniffer', 'bridge')
+
+# 磁盘缓存：Zabbix每次轮询都会重新执行脚本，缓存找到的device_id和站点状态供后续调用复用
+# 缓存放在当前用户私有的0700目录中，其他用户无法预先创建或篡改缓存文件
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "zabmetrics")
+CACHE_FILE = os.path.join(CACHE_DIR, "waf_device_cache.json")
+DEVICE_CACHE_TTL = 3600      # 有效device_id缓存1小时
+SITE_STATUS_CACHE_TTL = 60   # 站点启用状态缓存60秒
+TRAFFIC_CACHE_TTL = 30       # 流量数据在进程内缓存30秒（守护进程模式下多个监控项共享）
+
+# 守护进程模式默认的Unix套接字路径
+SOCKET_PATH = "/tmp/waf_collector.sock"
+# 套接字文件的默认权限：属主和属组可读写，守护进程与Zabbix agent用户不同时用--socket-group指定agent所在组
+SOCKET_MODE = 0o660
+# 客户端连接守护进程的超时和等待结果的超时（秒），需小于Zabbix agent的Timeout（默认3秒）
+CLIENT_CONNECT_TIMEOUT = 0.5
+CLIENT_READ_TIMEOUT = 2.5
+
+
+def _loads(content):
+    """
+    解析响应体中的JSON，安装了orjson时优先使用orjson
+    
+    :param content: 响应体字节串
+    :return: 解析后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _dumps(obj):
+    """
+    序列化为JSON字符串，安装了orjson时优先使用orjson
+    
+    :param obj: 待序列化的对象
+    :return: JSON字符串（UTF-8，不转义中文）
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _output(value):
+    """
+    向标准输出写出一行结果，直接写入底层字节缓冲区
+    
+    :param value: 待输出的值（bytes原样写出，其余转为字符串）
+    """
+    if not isinstance(value, bytes):
+        value = str(value).encode('utf-8')
+    # 先刷新文本层，保证与调试模式下print的输出顺序一致
+    sys.stdout.flush()
+    sys.stdout.buffer.write(value + b"\n")
+
+
+# 判断记录是否有效时需要跳过的字段
+_SKIP = frozenset({"timestamp"})
+
+
+def _has_valid(record):
+    """
+    判断一条流量记录是否有效（除跳过字段外不全是"-"）
+    
+    :param record: 流量记录
+    :return: True表示有效
+    """
+    # 用C层面的list.count统计"-"，再扣除跳过字段中的非"-"值，避免逐项的Python循环
+    values = list(record.values())
+    valid = len(values) - values.count("-")
+    for k in _SKIP:
+        if record.get(k, "-") != "-":
+            valid -= 1
+    return valid > 0
+
+
+def _iter_clusters(trees):
+    """
+    遍历集群拓扑树，依次产出集群ID（跳过空值以及"0"、"1"）
+    
+    :param trees: 各站点类型的拓扑节点列表
+    :return: 集群ID生成器
+    """
+    for tree_items in trees:
+        for item in tree_items:
+            for area in item.get("children", ()):
+                for cluster in area.get("children", ()):
+                    cluster_id = cluster.get("_pk")
+                    if cluster_id and cluster_id not in ("0", "1"):
+                        yield cluster_id
+
+
+def _latest_valid(traffic_data):
+    """
+    取最新的一条有效记录，get_metric、get_metrics和get_all_metrics共用
+    
+    :param traffic_data: 流量数据（按时间倒序排列）
+    :return: 有效记录，没有时返回None
+    """
+    for record in traffic_data:
+        if _has_valid(record):
+            return record
+    return None
+
+
+def _cache_key(*parts):
+    """
+    生成缓存键
+    
+    :param parts: 参与计算的字段（如WAF地址、站点ID）
+    :return: 缓存键
+    """
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _check_private(st):
+    """
+    检查缓存文件或目录属于当前用户且其他用户不可写
+    
+    :param st: os.stat_result
+    :raises OSError: 属主或权限不符合要求
+    """
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(f"缓存路径不是当前用户私有: {CACHE_DIR}")
+
+
+def _read_cache():
+    """
+    读取整个缓存文件，只接受当前用户拥有的文件
+    
+    :return: 缓存dict，文件不存在、不可信或内容损坏时返回空dict
+    """
+    try:
+        fd = os.open(CACHE_FILE, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return {}
+    with os.fdopen(fd, "r") as f:
+        try:
+            _check_private(os.fstat(f.fileno()))
+            cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _cache_get(key):
+    """
+    读取未过期的缓存项
+    
+    :param key: 缓存键
+    :return: 缓存值，不存在或已过期时返回None
+    """
+    entry = _read_cache().get(key)
+    if isinstance(entry, dict) and entry.get("expires", 0) > time.time():
+        return entry.get("value")
+    return None
+
+
+def _cache_set(key, value, ttl):
+    """
+    写入缓存项，使用文件锁和原子替换，避免并发的Zabbix轮询互相覆盖或读到半个文件
+    
+    :param key: 缓存键
+    :param value: 缓存值
+    :param ttl: 有效期（秒）
+    """
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        # 目录必须是当前用户私有的真实目录，否则不使用磁盘缓存
+        st = os.lstat(CACHE_DIR)
+        if not stat.S_ISDIR(st.st_mode):
+            return
+        _check_private(st)
+        
+        lock_fd = os.open(CACHE_FILE + ".lock", os.O_CREAT | os.O_WRONLY | os.O_NOFOLLOW, 0o600)
+        with os.fdopen(lock_fd, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            cache = _read_cache()
+            
+            # 顺便清理已过期的缓存项
+            now = time.time()
+            cache = {k: v for k, v in cache.items() if isinstance(v, dict) and v.get("expires", 0) > now}
+            cache[key] = {"value": value, "expires": now + ttl}
+            
+            fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=".waf_device_cache.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, CACHE_FILE)
+    except OSError:
+        pass
 
-# 禁用SSL警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class WAFTrafficCollector:
-    def __init__(self, host, token):
+    # 设备序列号的进程内缓存 {host: (序列号, 过期时间)}，同一进程内的多个实例共享
+    _device_serial_cache = {}
+    
+    def __init__(self, host, token, verify=False, parallel_probes=False):
         """
         初始化WAF监控客户端
         
         :param host: WAF管理地址
         :param token: API Token
+        :param verify: 证书校验，False表示不校验，也可传入CA证书文件路径
+        :param parallel_probes: 是否并发探测集群ID（仅用于常驻的守护进程）
         """
         self.host = host.rstrip('/')
         self.token = token
+        self.verify = verify
+        self.parallel_probes = parallel_probes
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
+        # HTTP会话在第一次请求时才创建，命中磁盘缓存的调用无需导入requests
+        self._session = None
+        # 各接口地址只拼接一次
+        self._url_device_info = f"{self.host}/api/v1/device/info/"
+        self._url_device_name = f"{self.host}/api/v1/device/name/"
+        self._url_site = f"{self.host}/api/v1/website/site/"
+        self._url_traffic = f"{self.host}/api/v1/logs/traffic/"
+        self._url_tree = f"{self.host}/api/v1/website/tree/{{}}/"
+        # 实例内的短期缓存（站点列表等）
+        self._cache = {}
+        # 流量数据缓存 {(app_id, device_id): (时间, 数据)}
+        self._traffic_cache = {}
+        # 单个device_id的探测结果缓存 {(app_id, device_id): (时间, (数据, 是否有效))}
+        self._probe_cache = {}
+        self._traffic_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """
+        复用同一个会话，一次调用中的多个请求共享TCP+TLS连接
+        
+        :return: requests.Session
+        """
+        if self._session is None:
+            # 延迟导入：requests及其依赖的导入耗时远高于一次缓存命中的调用
+            import requests
+            import urllib3
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            if self.verify is False:
+                # 不校验证书时禁用SSL警告
+                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            
+            session = requests.Session()
+            session.verify = self.verify
+            session.headers.update(self.headers)
+            # 只对幂等的GET重试，指数退避（0.5s、1s、2s），遵循服务端的Retry-After
+            retry = Retry(
+                total=3,
+                connect=2,
+                read=2,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=8,
+                max_retries=retry
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+    
+    def close(self):
+        """
+        关闭HTTP会话，释放连接
+        """
+        if self._session is not None:
+            self._session.close()
     
     def get_device_id(self):
         """
-        获取设备ID
+        获取设备ID，结果在进程内和磁盘上缓存DEVICE_CACHE_TTL秒
         
         :return: 设备ID
         """
+        cached = self._device_serial_cache.get(self.host)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        
+        cache_key = _cache_key(self.host, "device_serial")
+        serial = _cache_get(cache_key)
+        if serial:
+            self._device_serial_cache[self.host] = (serial, time.time() + DEVICE_CACHE_TTL)
+            return serial
+        
         try:
-            url = f"{self.host}/api/v1/device/info/"
-            response = requests.get(
-                url,
-                headers=self.headers,
-                verify=False,
-                timeout=10
+            response = self.session.get(
+                self._url_device_info,
+                timeout=DEFAULT_TIMEOUT
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _loads(response.content)
                 if data.get("code") == "SUCCESS":
                     # 使用设备序列号作为device_id
-                    return data.get("data", {}).get("serial", "")
+                    serial = data.get("data", {}).get("serial", "")
+                    if serial:
+                        self._device_serial_cache[self.host] = (serial, time.time() + DEVICE_CACHE_TTL)
+                        _cache_set(cache_key, serial, DEVICE_CACHE_TTL)
+                    return serial
             
             return None
             
@@ -59,13 +345,105 @@ class WAFTrafficCollector:
     
     def get_traffic_data(self, app_id, device_id=None, debug=False):
         """
-        获取指定站点的流量监控数据
+        获取指定站点的流量监控数据，结果在进程内缓存TRAFFIC_CACHE_TTL秒
+        
+        :param app_id: 站点ID
+        :param device_id: 设备ID（可选）
+        :param debug: 是否启用调试模式（调试时不使用缓存）
+        :return: 返回最新的流量数据
+        """
+        key = (app_id, device_id)
+        if not debug:
+            with self._traffic_lock:
+                cached = self._traffic_cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < TRAFFIC_CACHE_TTL:
+                return cached[1]
+        
+        result = self._get_traffic_data(app_id, device_id, debug)
+        with self._traffic_lock:
+            self._traffic_cache[key] = (time.monotonic(), result)
+        return result
+    
+    def _get_traffic_data(self, app_id, device_id=None, debug=False):
+        """
+        请求WAF接口获取流量数据，必要时查找站点实际使用的device_id
         
         :param app_id: 站点ID
         :param device_id: 设备ID（可选）
         :param debug: 是否启用调试模式
         :return: 返回最新的流量数据
         """
+        # 公共请求参数只构建一次，每次尝试仅补充device_id
+        base_params = {
+            "type": "mins",
+            "app_id": app_id
+        }
+        
+        # 本次查找中已经请求过的device_id，同一个ID不重复请求
+        tried = set()
+        
+        # 定义一个内部函数来尝试获取数据，返回(数据, 是否包含有效记录)
+        # 集群ID会在线程池中并发探测，因此每次请求使用独立的参数字典
+        def try_get_data(test_device_id):
+            tried.add(test_device_id)
+            # 分钟粒度的数据在两次轮询之间不会变化，同一个device_id的探测结果短时间内复用
+            probe_key = (app_id, test_device_id)
+            if not debug:
+                with self._traffic_lock:
+                    cached = self._probe_cache.get(probe_key)
+                if cached is not None and time.monotonic() - cached[0] < TRAFFIC_CACHE_TTL:
+                    return cached[1]
+            
+            params = {**base_params, "device_id": test_device_id}
+            
+            if debug:
+                print(f"尝试device_id: {test_device_id}")
+                print(f"请求参数: {params}")
+            
+            try:
+                response = self.session.get(
+                    self._url_traffic,
+                    params=params,
+                    timeout=SLOW_TIMEOUT
+                )
+                
+                if response.status_code == 200:
+                    data = _loads(response.content)
+                    if data.get("code") == "SUCCESS":
+                        result = data.get("data", {}).get("result", [])
+                        # 检查是否有有效数据（不全是"-"），找到第一条有效记录即停止
+                        valid = any(_has_valid(record) for record in result)
+                        if debug and valid:
+                            print(f"找到有效数据，使用device_id: {test_device_id}")
+                        with self._traffic_lock:
+                            self._probe_cache[probe_key] = (time.monotonic(), (result, valid))
+                        return result, valid
+            except Exception as e:
+                if debug:
+                    print(f"请求异常: {e}")
+            return [], False
+        
+        # 缓存键包含调用方传入的device_id：缓存的替代ID只替换之前失败的同一个ID，
+        # 传入的device_id变化后仍会先尝试新的ID
+        cache_key = _cache_key(self.host, app_id, device_id or "")
+        
+        def found(test_device_id, test_result):
+            # 通过查找得到的device_id写入磁盘缓存，下次轮询直接使用
+            if test_device_id != requested_device_id:
+                _cache_set(cache_key, test_device_id, DEVICE_CACHE_TTL)
+            return test_result
+        
+        requested_device_id = device_id
+        
+        # 优先尝试上次查找到的有效device_id
+        cached_device_id = _cache_get(cache_key)
+        if cached_device_id:
+            if debug:
+                print(f"尝试缓存的device_id: {cached_device_id}")
+            result, has_valid = try_get_data(cached_device_id)
+            if has_valid:
+                return result
+        
         # 如果没有提供device_id，尝试自动获取
         if not device_id:
             device_id = self.get_device_id()
@@ -100,123 +478,129 @@ class WAFTrafficCollector:
                     device_id = device_serial
                     original_device_id = device_serial
         
-        # 定义一个内部函数来尝试获取数据
-        def try_get_data(test_device_id):
-            params = {
-                "type": "mins",
-                "app_id": app_id,
-                "device_id": test_device_id,
-                "_ts": int(time.time() * 1000)
-            }
-            
-            if debug:
-                print(f"尝试device_id: {test_device_id}")
-                print(f"请求参数: {params}")
-            
-            try:
-                response = requests.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    verify=False,
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("code") == "SUCCESS":
-                        result = data.get("data", {}).get("result", [])
-                        # 检查是否有有效数据（不全是"-"）
-                        if result:
-                            for record in result:
-                                for key, value in record.items():
-                                    if key != "timestamp" and value != "-":
-                                        if debug:
-                                            print(f"找到有效数据，使用device_id: {test_device_id}")
-                                        return result
-                        return result
-            except Exception as e:
-                if debug:
-                    print(f"请求异常: {e}")
-            return []
-        
-        url = f"{self.host}/api/v1/logs/traffic/"
-        
-        # 首先尝试使用原始device_id
-        result = try_get_data(original_device_id)
-        if result and any(v != "-" for record in result for k, v in record.items() if k != "timestamp"):
-            return result
+        # 首先尝试使用原始device_id；默认值"default"几乎不会返回数据，直接进入查找流程
+        if original_device_id and original_device_id != "default":
+            result, has_valid = try_get_data(original_device_id)
+            if has_valid:
+                return found(original_device_id, result)
+        else:
+            result, has_valid = [], False
         
         # 如果原始device_id返回的都是"-"，尝试其他方式
-        if original_device_id == "0" or not any(v != "-" for record in result for k, v in record.items() if k != "timestamp"):
+        if original_device_id == "0" or not has_valid:
             if debug:
                 print("原始device_id未返回有效数据，尝试查找实际设备ID...")
             
             # 方法1：从站点信息中查找可能的device_id
             try:
-                site_url = f"{self.host}/api/v1/website/site/"
-                site_params = {"page": 1, "per_page": 1000}
-                site_response = requests.get(
-                    site_url,
-                    headers=self.headers,
-                    params=site_params,
-                    verify=False,
-                    timeout=10
-                )
-                if site_response.status_code == 200:
-                    site_data = site_response.json()
-                    if site_data.get("code") == "SUCCESS":
-                        sites = site_data.get("data", {}).get("result", [])
-                        for site in sites:
-                            if site.get("_pk") == app_id:
-                                struct_pk = site.get("struct_pk", "")
-                                if struct_pk and struct_pk != original_device_id:
-                                    test_result = try_get_data(struct_pk)
-                                    if test_result and any(v != "-" for record in test_result for k, v in record.items() if k != "timestamp"):
-                                        return test_result
-                                break
+                sites = self._fetch_sites()
+                if sites is not None:
+                    site_by_pk = {site["_pk"]: site for site in sites if "_pk" in site}
+                    site = site_by_pk.get(app_id)
+                    if site:
+                        struct_pk = site.get("struct_pk", "")
+                        if struct_pk and struct_pk not in tried:
+                            test_result, test_valid = try_get_data(struct_pk)
+                            if test_valid:
+                                return found(struct_pk, test_result)
             except Exception:
                 pass
             
-            # 方法2：尝试从集群拓扑中查找
+            # 方法2：尝试从集群拓扑中查找，按拓扑顺序取第一个返回有效数据的集群ID
             try:
-                for site_type in ['transparent', 'reverse', 'traction', 'sniffer', 'bridge']:
-                    tree_url = f"{self.host}/api/v1/website/tree/{site_type}/"
-                    tree_response = requests.get(
-                        tree_url,
-                        headers=self.headers,
-                        verify=False,
-                        timeout=10
-                    )
-                    if tree_response.status_code == 200:
-                        tree_data = tree_response.json()
-                        if tree_data.get("code") == "SUCCESS":
-                            tree_items = tree_data.get("data", [])
-                            for item in tree_items:
-                                for area in item.get("children", []):
-                                    for cluster in area.get("children", []):
-                                        cluster_id = cluster.get("_pk")
-                                        if cluster_id and cluster_id not in ["0", "1", original_device_id]:
-                                            test_result = try_get_data(cluster_id)
-                                            if test_result and any(v != "-" for record in test_result for k, v in record.items() if k != "timestamp"):
-                                                if debug:
-                                                    print(f"成功使用集群ID: {cluster_id}")
-                                                return test_result
+                # 不同类型的拓扑树可能包含相同的集群，去重后保持原有顺序
+                cluster_ids = [cluster_id for cluster_id in dict.fromkeys(_iter_clusters(self._fetch_trees()))
+                               if cluster_id not in tried]
+                executor = None
+                futures = []
+                if self.parallel_probes and len(cluster_ids) > 1:
+                    # 守护进程中并发探测；进程常驻，找到结果后未完成的探测可以在后台结束
+                    executor = ThreadPoolExecutor(max_workers=min(len(cluster_ids), 8))
+                    futures = [executor.submit(try_get_data, cluster_id) for cluster_id in cluster_ids]
+                    probes = zip(cluster_ids, (future.result() for future in futures))
+                else:
+                    # 单次执行的CLI逐个探测，退出时不会等待仍在进行的请求
+                    probes = ((cluster_id, try_get_data(cluster_id)) for cluster_id in cluster_ids)
+                try:
+                    for cluster_id, (test_result, test_valid) in probes:
+                        if test_valid:
+                            if debug:
+                                print(f"成功使用集群ID: {cluster_id}")
+                            return found(cluster_id, test_result)
+                finally:
+                    if executor is not None:
+                        # 已找到结果时取消尚未开始的探测
+                        for future in futures:
+                            future.cancel()
+                        executor.shutdown(wait=False)
             except Exception:
                 pass
             
             # 方法3：如果还是没有找到，尝试使用获取的设备序列号
             device_serial = self.get_device_id()
-            if device_serial and device_serial != original_device_id:
+            if device_serial and device_serial not in tried:
                 if debug:
                     print(f"尝试使用设备序列号: {device_serial}")
-                test_result = try_get_data(device_serial)
-                if test_result and any(v != "-" for record in test_result for k, v in record.items() if k != "timestamp"):
-                    return test_result
+                test_result, test_valid = try_get_data(device_serial)
+                if test_valid:
+                    return found(device_serial, test_result)
         
         # 返回最后的结果（可能都是"-"）
         return result
     
+    def _fetch_sites(self):
+        """
+        获取站点列表，结果在实例内缓存SITE_STATUS_CACHE_TTL秒
+        
+        :return: 站点列表，获取失败返回None
+        """
+        cached = self._cache.get("sites")
+        if cached is not None and time.monotonic() - cached[0] < SITE_STATUS_CACHE_TTL:
+            return cached[1]
+        
+        params = {
+            "page": 1,
+            "per_page": 1000
+        }
+        response = self.session.get(
+            self._url_site,
+            params=params,
+            timeout=DEFAULT_TIMEOUT
+        )
+        if response.status_code == 200:
+            data = _loads(response.content)
+            if data.get("code") == "SUCCESS":
+                sites = data.get("data", {}).get("result", [])
+                self._cache["sites"] = (time.monotonic(), sites)
+                return sites
+        return None
+    
+    def _fetch_trees(self):
+        """
+        并发获取各类型站点的集群拓扑树
+        
+        :return: 按站点类型顺序排列的拓扑节点列表，获取失败的类型为空列表
+        """
+        # 在主线程中创建会话，避免多个工作线程同时初始化
+        session = self.session
+        
+        def fetch_tree(site_type):
+            try:
+                tree_response = session.get(
+                    self._url_tree.format(site_type),
+                    timeout=DEFAULT_TIMEOUT
+                )
+                if tree_response.status_code == 200:
+                    tree_data = _loads(tree_response.content)
+                    if tree_data.get("code") == "SUCCESS":
+                        return tree_data.get("data", [])
+            except Exception:
+                pass
+            return []
+        
+        with ThreadPoolExecutor(max_workers=len(_SITE_TYPES)) as executor:
+            return list(executor.map(fetch_tree, _SITE_TYPES))
+    
     def get_metric(self, app_id, metric_name, device_id=None):
         """
         获取指定站点和指标的最新值
@@ -227,28 +611,45 @@ class WAFTrafficCollector:
         :return: 指标值
         """
         try:
-            traffic_data = self.get_traffic_data(app_id, device_id)
+            record = _latest_valid(self.get_traffic_data(app_id, device_id))
             
-            if not traffic_data:
+            # 如果没有有效数据，返回0
+            if record is None:
                 return 0
             
-            # 返回最新的数据（第一条记录）
-            # traffic_data已经按时间倒序排列，第一条就是最新的
-            if traffic_data:
-                latest_record = traffic_data[0]
-                value = latest_record.get(metric_name, "-")
-                # 如果值是"-"，返回0
-                if value == "-":
-                    return 0
-                return value
-            
-            # 如果没有数据，返回0
-            return 0
+            value = record.get(metric_name, "-")
+            # 如果值是"-"，返回0
+            if value == "-":
+                return 0
+            return value
             
         except Exception as e:
             # 出错时返回0，避免Zabbix报错
             return 0
     
+    def get_metrics(self, app_id, metric_names, device_id=None):
+        """
+        获取指定站点多个指标的最新值，只请求一次流量数据
+        
+        :param app_id: 站点ID
+        :param metric_names: 指标名称列表
+        :param device_id: 设备ID（可选）
+        :return: dict，key为指标名称，value为指标值
+        """
+        try:
+            record = _latest_valid(self.get_traffic_data(app_id, device_id))
+        except Exception:
+            record = None
+        
+        if record is None:
+            record = {}
+        metrics = {}
+        for metric_name in metric_names:
+            value = record.get(metric_name, "-")
+            # 如果值是"-"，返回0
+            metrics[metric_name] = 0 if value == "-" else value
+        return metrics
+    
     def get_all_metrics(self, app_id, device_id=None):
         """
         获取指定站点的所有指标
@@ -257,54 +658,49 @@ class WAFTrafficCollector:
         :param device_id: 设备ID（可选）
         :return: JSON格式的所有指标数据
         """
+        # 采集时间只格式化一次，各分支共用
+        now_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
         try:
             traffic_data = self.get_traffic_data(app_id, device_id)
             
             if not traffic_data:
-                return json.dumps({
+                return _dumps({
                     "status": "no_data",
                     "app_id": app_id,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    "timestamp": now_str
                 })
             
             # 查找最新的有效数据
-            for record in traffic_data:
-                # 检查是否是有效数据
-                valid_data = False
+            record = _latest_valid(traffic_data)
+            if record is not None:
+                # 构建返回数据
+                metrics = {}
                 for key, value in record.items():
-                    if key != "timestamp" and value != "-":
-                        valid_data = True
-                        break
+                    if key != "timestamp":
+                        metrics[key] = 0 if value == "-" else value
+                
+                metrics.update({
+                    "status": "ok",
+                    "app_id": app_id,
+                    "data_timestamp": record.get("timestamp", ""),
+                    "collect_timestamp": now_str
+                })
                 
-                if valid_data:
-                    # 构建返回数据
-                    metrics = {}
-                    for key, value in record.items():
-                        if key != "timestamp":
-                            metrics[key] = 0 if value == "-" else value
-                    
-                    metrics.update({
-                        "status": "ok",
-                        "app_id": app_id,
-                        "data_timestamp": record.get("timestamp", ""),
-                        "collect_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                    
-                    return json.dumps(metrics, ensure_ascii=False)
+                return _dumps(metrics)
             
             # 如果没有有效数据
-            return json.dumps({
+            return _dumps({
                 "status": "all_empty",
                 "app_id": app_id,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "timestamp": now_str
             })
             
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "status": "error",
                 "app_id": app_id,
                 "error": str(e),
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "timestamp": now_str
             })
     
     def check_site_status(self, app_id):
@@ -314,29 +710,19 @@ class WAFTrafficCollector:
         :param app_id: 站点ID
         :return: 1表示正常，0表示异常
         """
+        # 站点状态短时间内不会变化，优先使用磁盘缓存
+        cache_key = _cache_key(self.host, "site_status")
+        statuses = _cache_get(cache_key)
+        if statuses is not None:
+            return statuses.get(app_id, 0)
+        
         try:
             # 获取站点信息
-            url = f"{self.host}/api/v1/website/site/"
-            params = {
-                "page": 1,
-                "per_page": 1000
-            }
-            
-            response = requests.get(
-                url,
-                headers=self.headers,
-                params=params,
-                verify=False,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == "SUCCESS":
-                    sites = data.get("data", {}).get("result", [])
-                    for site in sites:
-                        if site.get("_pk") == app_id:
-                            return 1 if site.get("enable", False) else 0
+            sites = self._fetch_sites()
+            if sites is not None:
+                statuses = {site.get("_pk"): 1 if site.get("enable", False) else 0 for site in sites}
+                _cache_set(cache_key, statuses, SITE_STATUS_CACHE_TTL)
+                return statuses.get(app_id, 0)
             
             return 0
             
@@ -354,44 +740,34 @@ class WAFTrafficCollector:
         """
         try:
             # 从 /api/v1/device/name/ 接口获取设备ID
-            device_name_url = f"{self.host}/api/v1/device/name/"
-            params = {"_ts": int(time.time() * 1000)}
-            
-            response = requests.get(
-                device_name_url,
-                headers=self.headers,
-                params=params,
-                verify=False,
-                timeout=10
+            response = self.session.get(
+                self._url_device_name,
+                timeout=DEFAULT_TIMEOUT
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _loads(response.content)
                 if data.get("code") == "SUCCESS":
                     device_id = data.get("data", {}).get("id")
                     if device_id:
                         if debug:
                             print(f"从device/name接口获取到device_id: {device_id}")
                         # 验证这个device_id是否能获取到流量数据
-                        url = f"{self.host}/api/v1/logs/traffic/"
                         test_params = {
                             "type": "mins",
                             "app_id": app_id,
-                            "device_id": device_id,
-                            "_ts": int(time.time() * 1000)
+                            "device_id": device_id
                         }
-                        test_response = requests.get(
-                            url,
-                            headers=self.headers,
+                        test_response = self.session.get(
+                            self._url_traffic,
                             params=test_params,
-                            verify=False,
-                            timeout=10
+                            timeout=SLOW_TIMEOUT
                         )
                         if test_response.status_code == 200:
-                            test_data = test_response.json()
+                            test_data = _loads(test_response.content)
                             if test_data.get("code") == "SUCCESS":
                                 result = test_data.get("data", {}).get("result", [])
-                                if result and any(v != "-" for record in result for k, v in record.items() if k != "timestamp"):
+                                if result and any(_has_valid(record) for record in result):
                                     return device_id
                                 elif debug:
                                     print(f"device_id {device_id} 返回的数据都是空的")
@@ -407,6 +783,158 @@ class WAFTrafficCollector:
             return None
 
 
+def _dispatch(collector, app_id, op, device_id=None):
+    """
+    执行一次采集请求，CLI和守护进程共用
+    
+    :param collector: WAFTrafficCollector实例
+    :param app_id: 站点ID
+    :param op: "--check"、"--all"、"--metrics=指标1,指标2"或单个指标名称
+    :param device_id: 设备ID（可选）
+    :return: 输出内容（字符串）
+    """
+    if op == "--check":
+        return str(collector.check_site_status(app_id))
+    if op == "--all":
+        return collector.get_all_metrics(app_id, device_id)
+    if op.startswith("--metrics="):
+        metric_names = [m for m in op[len("--metrics="):].split(',') if m]
+        return _dumps(collector.get_metrics(app_id, metric_names, device_id))
+    return str(collector.get_metric(app_id, op, device_id))
+
+
+def serve(collector, socket_path=SOCKET_PATH, mode=SOCKET_MODE, group=None):
+    """
+    以守护进程方式运行，通过Unix套接字响应采集请求
+    进程内复用HTTP会话、device_id和流量数据缓存，Zabbix每次轮询只需一次本地套接字往返
+    
+    请求格式为一行 "host\tapp_id\top[\tdevice_id]"
+    响应为一行 "OK\t结果"，或在请求的WAF地址与本进程不一致、请求格式错误时返回 "ERR\t原因"
+    
+    :param collector: WAFTrafficCollector实例
+    :param socket_path: Unix套接字路径
+    :param mode: 套接字文件权限
+    :param group: 套接字文件的属组（组名或GID，可选），用于允许该组用户连接
+    :raises OSError: 套接字路径已被占用（已有守护进程在运行或不是套接字文件）、属组不存在或设置权限失败
+    """
+    import grp
+    import signal
+    import socket
+    import socketserver
+    
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, status, result):
+            try:
+                self.wfile.write(f"{status}\t{result}\n".encode('utf-8'))
+            except BrokenPipeError:
+                # 客户端已超时断开
+                pass
+        
+        def handle(self):
+            line = self.rfile.readline().decode('utf-8').rstrip("\r\n")
+            if not line:
+                # 只建立连接不发送请求（如检测守护进程是否在运行）
+                return
+            parts = line.split("\t")
+            if len(parts) < 3 or not all(parts[:3]):
+                self.reply("ERR", "请求格式错误")
+                return
+            host, app_id, op = parts[:3]
+            # 守护进程只服务启动时指定的WAF，其他地址的请求由客户端自行采集
+            if host.rstrip('/') != collector.host:
+                self.reply("ERR", f"守护进程服务的WAF地址为{collector.host}")
+                return
+            device_id = parts[3] if len(parts) > 3 and parts[3] else None
+            try:
+                result = _dispatch(collector, app_id, op, device_id)
+            except Exception:
+                result = "0"
+            self.reply("OK", result)
+    
+    gid = -1
+    if group is not None:
+        try:
+            gid = int(group) if str(group).isdigit() else grp.getgrnam(group).gr_gid
+        except KeyError:
+            raise OSError(errno.EINVAL, f"用户组 {group} 不存在")
+    
+    # 套接字文件已存在时，只清理上次异常退出遗留的失效套接字，不接管正在运行的守护进程
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        st = None
+    if st is not None:
+        if not stat.S_ISSOCK(st.st_mode):
+            raise OSError(errno.EEXIST, f"{socket_path} 已存在且不是套接字文件")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.settimeout(CLIENT_CONNECT_TIMEOUT)
+            try:
+                probe.connect(socket_path)
+            except ConnectionRefusedError:
+                os.unlink(socket_path)
+            else:
+                raise OSError(errno.EADDRINUSE, f"已有守护进程在 {socket_path} 上运行")
+    
+    # 在主线程中创建会话，避免多个处理线程同时初始化
+    collector.session
+    # 绑定时临时收紧umask，使套接字文件创建后、设置权限前不会被其他用户连接
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    finally:
+        os.umask(old_umask)
+    try:
+        if gid != -1:
+            os.chown(socket_path, -1, gid)
+        os.chmod(socket_path, mode)
+    except OSError:
+        server.server_close()
+        os.unlink(socket_path)
+        raise
+    server.daemon_threads = True
+    # 收到SIGTERM时正常退出，以便清理套接字文件
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def request_daemon(host, app_id, op, device_id=None, socket_path=SOCKET_PATH,
+                   connect_timeout=CLIENT_CONNECT_TIMEOUT, read_timeout=CLIENT_READ_TIMEOUT):
+    """
+    向守护进程发送一次采集请求
+    
+    :param host: WAF管理地址，与守护进程服务的地址不一致时守护进程拒绝请求
+    :param app_id: 站点ID
+    :param op: 请求内容，格式同_dispatch
+    :param device_id: 设备ID（可选）
+    :param socket_path: Unix套接字路径
+    :param connect_timeout: 连接超时时间（秒）
+    :param read_timeout: 等待结果的超时时间（秒）
+    :return: 守护进程返回的结果（bytes，不含换行）；守护进程拒绝请求时返回None
+    """
+    import socket
+    
+    line = "\t".join([host.rstrip('/'), app_id, op, device_id or ""]) + "\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(connect_timeout)
+        sock.connect(socket_path)
+        sock.settimeout(read_timeout)
+        sock.sendall(line.encode('utf-8'))
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    status, _, result = b"".join(chunks).rstrip(b"\n").partition(b"\t")
+    if status != b"OK":
+        return None
+    return result
+
+
 def main():
     """
     主函数
@@ -414,39 +942,107 @@ def main():
     parser = argparse.ArgumentParser(description='明御WAF流量数据采集脚本')
     parser.add_argument('--host', required=True, help='WAF管理地址')
     parser.add_argument('--token', required=True, help='API Token')
-    parser.add_argument('--app-id', required=True, help='站点ID')
+    parser.add_argument('--app-id', help='站点ID')
     parser.add_argument('--device-id', help='设备ID（可选，会自动获取）')
     parser.add_argument('--metric', help='要获取的指标名称')
+    parser.add_argument('--metrics', type=lambda s: [m for m in s.split(',') if m],
+                        help='要获取的多个指标名称，逗号分隔，以JSON格式一次输出')
     parser.add_argument('--all', action='store_true', help='获取所有指标')
     parser.add_argument('--check', action='store_true', help='检查站点状态')
     parser.add_argument('--debug', action='store_true', help='调试模式')
+    parser.add_argument('--ca-bundle', help='用于校验WAF证书的CA证书文件（不指定则不校验证书）')
+    parser.add_argument('--daemon', action='store_true', help='以守护进程方式运行，通过Unix套接字提供数据')
+    parser.add_argument('--client', action='store_true',
+                        help='通过守护进程获取数据（守护进程未运行或无权限连接套接字时在本进程内采集）')
+    parser.add_argument('--client-timeout', type=float, default=CLIENT_READ_TIMEOUT,
+                        help=f'等待守护进程返回结果的超时时间，需小于Zabbix agent的Timeout（默认{CLIENT_READ_TIMEOUT}秒）')
+    parser.add_argument('--socket', default=SOCKET_PATH, help=f'守护进程的Unix套接字路径（默认{SOCKET_PATH}）')
+    parser.add_argument('--socket-mode', type=lambda s: int(s, 8), default=SOCKET_MODE,
+                        help=f'守护进程套接字文件的权限，八进制（默认{SOCKET_MODE:o}）')
+    parser.add_argument('--socket-group',
+                        help='守护进程套接字文件的属组，守护进程与Zabbix agent以不同用户运行时设为agent所在的组（如zabbix）')
     
     args = parser.parse_args()
     
+    if not args.daemon and not args.app_id:
+        parser.error("必须指定 --app-id 参数")
+    
+    if args.client:
+        if args.check:
+            op = "--check"
+        elif args.all:
+            op = "--all"
+        elif args.metrics:
+            op = "--metrics=" + ",".join(args.metrics)
+        elif args.metric:
+            op = args.metric
+        else:
+            parser.error("必须指定 --metric、--metrics、--all 或 --check 参数之一")
+        try:
+            # 守护进程拒绝请求（服务的是其他WAF）时同样返回None，在本进程内采集
+            result = request_daemon(args.host, args.app_id, op, args.device_id, args.socket,
+                                    read_timeout=args.client_timeout)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # 守护进程未运行时，回退到在本进程内采集
+            result = None
+        except PermissionError as e:
+            # 当前用户无权连接套接字（守护进程的--socket-mode/--socket-group配置不当），
+            # 请求未送达守护进程，回退到在本进程内采集；调试模式下提示修正配置
+            if args.debug:
+                print(f"无权连接守护进程套接字，在本进程内采集: {e}", file=sys.stderr)
+            result = None
+        except OSError as e:
+            # 守护进程已接受请求但未及时返回，不重复采集，避免与守护进程同时请求WAF
+            print(f"守护进程请求失败: {e}", file=sys.stderr)
+            sys.exit(1)
+        if result is not None:
+            _output(result)
+            sys.stdout.flush()
+            return
+    
     # 创建采集器
-    collector = WAFTrafficCollector(host=args.host, token=args.token)
+    collector = WAFTrafficCollector(host=args.host, token=args.token, verify=args.ca_bundle or False,
+                                    parallel_probes=args.daemon)
     
     # 执行相应的操作
-    if args.check:
-        # 检查站点状态
-        status = collector.check_site_status(args.app_id)
-        print(status)
-    elif args.all:
-        # 获取所有指标
-        metrics = collector.get_all_metrics(args.app_id, args.device_id)
-        print(metrics)
-    elif args.metric:
-        # 如果是调试模式，先打印原始数据
-        if args.debug:
-            traffic_data = collector.get_traffic_data(args.app_id, args.device_id, debug=True)
-            print("---返回的流量数据---")
-            print(json.dumps(traffic_data, indent=2, ensure_ascii=False))
-            print("---")
-        # 获取单个指标
-        value = collector.get_metric(args.app_id, args.metric, args.device_id)
-        print(value)
-    else:
-        parser.error("必须指定 --metric、--all 或 --check 参数之一")
+    try:
+        if args.daemon:
+            try:
+                serve(collector, args.socket, args.socket_mode, args.socket_group)
+            except OSError as e:
+                print(f"守护进程启动失败: {e}", file=sys.stderr)
+                sys.exit(1)
+        elif args.check:
+            # 检查站点状态
+            status = collector.check_site_status(args.app_id)
+            _output(status)
+        elif args.all:
+            # 获取所有指标
+            metrics = collector.get_all_metrics(args.app_id, args.device_id)
+            _output(metrics)
+        elif args.metrics:
+            # 一次请求获取多个指标
+            metrics = collector.get_metrics(args.app_id, args.metrics, args.device_id)
+            _output(_dumps(metrics))
+        elif args.metric:
+            if args.debug:
+                # 调试模式下先打印原始数据，再直接从这份数据中取指标值，避免重复请求
+                traffic_data = collector.get_traffic_data(args.app_id, args.device_id, debug=True)
+                print("---返回的流量数据---")
+                print(json.dumps(traffic_data, indent=2, ensure_ascii=False))
+                print("---")
+                value = (_latest_valid(traffic_data) or {}).get(args.metric, "-")
+                if value == "-":
+                    value = 0
+            else:
+                # 获取单个指标
+                value = collector.get_metric(args.app_id, args.metric, args.device_id)
+            _output(value)
+        else:
+            parser.error("必须指定 --metric、--metrics、--all 或 --check 参数之一")
+    finally:
+        collector.close()
+        sys.stdout.flush()
 
 
 if __name__ == "__main__":